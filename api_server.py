@@ -18,19 +18,37 @@ price_cache = {}
 exchange_rate_cache = {}
 CACHE_DURATION = 60  # seconds
 EXCHANGE_RATE_CACHE_DURATION = 3600  # 1 hour for exchange rates
+META_CACHE_DURATION = 86400  # 24 hours for name / currency
+meta_cache = {}
 
 def get_cached_or_fetch(symbol, fetch_func):
     """Get data from cache or fetch new data"""
     now = datetime.now()
     if symbol in price_cache:
         cached_time, cached_data = price_cache[symbol]
-        if (now - cached_time).seconds < CACHE_DURATION:
+        if (now - cached_time).total_seconds() < CACHE_DURATION:
             return cached_data
 
     data = fetch_func(symbol)
     price_cache[symbol] = (now, data)
     return data
 
+def get_cached_meta(ticker, symbol):
+    """Get name/currency from cache, calling the slow ticker.info at most once a day"""
+    now = datetime.now()
+    if symbol in meta_cache:
+        cached_time, meta = meta_cache[symbol]
+        if (now - cached_time).total_seconds() < META_CACHE_DURATION:
+            return meta
+
+    info = ticker.info
+    meta = {
+        'currency': info.get('currency', 'USD'),
+        'name': info.get('longName', symbol)
+    }
+    meta_cache[symbol] = (now, meta)
+    return meta
+
 @app.route('/api/stock/<symbol>', methods=['GET'])
 def get_stock_price(symbol):
     """
@@ -40,30 +58,32 @@ def get_stock_price(symbol):
     try:
         def fetch_stock(sym):
             ticker = yf.Ticker(sym)
-            info = ticker.info
             hist = ticker.history(period='2d')
 
             if hist.empty:
                 return {'error': 'No data available'}
 
-            current_price = hist['Close'].iloc[-1]
+            close = hist['Close'].to_numpy()
+            current_price = close[-1]
 
             # Calculate change
-            if len(hist) >= 2:
-                prev_close = hist['Close'].iloc[-2]
+            if len(close) >= 2:
+                prev_close = close[-2]
                 change = current_price - prev_close
                 change_percent = (change / prev_close) * 100
             else:
                 change = 0
                 change_percent = 0
 
+            meta = get_cached_meta(ticker, sym)
+
             return {
                 'symbol': sym,
                 'price': round(float(current_price), 2),
                 'change': round(float(change), 2),
                 'changePercent': round(float(change_percent), 2),
-                'currency': info.get('currency', 'USD'),
-                'name': info.get('longName', sym),
+                'currency': meta['currency'],
+                'name': meta['name'],
                 'timestamp': datetime.now().isoformat()
             }
 
@@ -92,10 +112,11 @@ def get_batch_stocks():
                     if hist.empty:
                         return {'error': 'No data available'}
 
-                    current_price = hist['Close'].iloc[-1]
+                    close = hist['Close'].to_numpy()
+                    current_price = close[-1]
 
-                    if len(hist) >= 2:
-                        prev_close = hist['Close'].iloc[-2]
+                    if len(close) >= 2:
+                        prev_close = close[-2]
                         change = current_price - prev_close
                         change_percent = (change / prev_close) * 100
                     else:
@@ -145,29 +166,29 @@ def get_major_indices():
                     if hist.empty:
                         return {'error': 'No data available'}
 
-                    current_value = hist['Close'].iloc[-1]
+                    close = hist['Close'].to_numpy()
+                    current_value = close[-1]
 
-                    if len(hist) >= 2:
-                        prev_close = hist['Close'].iloc[-2]
+                    if len(close) >= 2:
+                        prev_close = close[-2]
                         change = current_value - prev_close
                         change_percent = (change / prev_close) * 100
                     else:
                         change = 0
                         change_percent = 0
 
-                    # OHLCV for expandable card
+                    # OHLCV for expandable card — today's bar, not the 5-day range
                     latest = hist.iloc[-1]
-                    closes = [round(float(c), 2) for c in hist['Close'].tolist()]
 
                     return {
                         'value': round(safe_float(current_value), 2),
                         'change': round(safe_float(change), 2),
                         'changePercent': round(safe_float(change_percent), 2),
                         'open': round(safe_float(latest['Open']), 2),
-                        'high': round(safe_float(hist['High'].max()), 2),
-                        'low': round(safe_float(hist['Low'].min()), 2),
+                        'high': round(safe_float(latest['High']), 2),
+                        'low': round(safe_float(latest['Low']), 2),
                         'volume': int(latest['Volume']),
-                        'closes': closes
+                        'closes': close.round(2).tolist()
                     }
 
                 results[name] = get_cached_or_fetch(symbol, fetch_index)
@@ -302,7 +323,7 @@ def get_exchange_rate():
         now = datetime.now()
         if 'USDTWD' in exchange_rate_cache:
             cached_time, cached_rate = exchange_rate_cache['USDTWD']
-            if (now - cached_time).seconds < EXCHANGE_RATE_CACHE_DURATION:
+            if (now - cached_time).total_seconds() < EXCHANGE_RATE_CACHE_DURATION:
                 return jsonify({
                     'rate': cached_rate,
                     'cached': True,
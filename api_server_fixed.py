@@ -3,18 +3,47 @@ Stock Portfolio API Server - Fixed Version
 Uses yahooquery (primary) + yfinance (fallback) with retry and LRU cache
 """
 
-from flask import Flask, jsonify, request, send_file
+import os
+
+# Run directly (outside gunicorn, whose gevent worker patches by itself):
+# make sockets cooperative before requests / yfinance are imported, so one
+# process can wait on many upstream fetches at once.  Skipped for the debug
+# reloader, which does not play well with monkey-patching.
+GEVENT_AVAILABLE = False
+if __name__ == '__main__' and os.environ.get('FLASK_DEBUG') != '1':
+    try:
+        from gevent import monkey
+        monkey.patch_all()
+        GEVENT_AVAILABLE = True
+    except ImportError:
+        pass
+
+from flask import Flask, Response, abort, g, jsonify, request, stream_with_context
 from flask_cors import CORS
+from flask.json.provider import JSONProvider
+from flask_compress import Compress
+import orjson
 import yfinance as yf
-import os
-from datetime import datetime, timedelta
-import json
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 import time
-import urllib.request
-import urllib.parse
-import xml.etree.ElementTree as ET
+import gzip
+import hashlib
+import heapq
 import re
-from collections import OrderedDict
+import sqlite3
+import string
+from io import BytesIO
+from itertools import islice
+import threading
+from bisect import bisect_right
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 
 # Optional: yahooquery for more reliable Yahoo Finance access
 try:
@@ -25,43 +54,653 @@ except ImportError:
     YAHOOQUERY_AVAILABLE = False
     print("yahooquery not installed — using yfinance only (pip install yahooquery to enable)")
 
+# Optional: lxml (libxml2) parses Google News RSS faster than ElementTree;
+# both expose the same iterparse()/find() API used here
+try:
+    from lxml import etree as ET
+    LXML_AVAILABLE = True
+    print("lxml available — fast RSS parsing")
+except ImportError:
+    import xml.etree.ElementTree as ET
+    LXML_AVAILABLE = False
+    print("lxml not installed — parsing RSS with ElementTree (pip install lxml to enable)")
+
+# Optional: MessagePack responses for clients sending Accept: application/msgpack
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+    print("msgpack not installed — JSON responses only (pip install msgpack to enable)")
+
+# Optional: Redis as a cache shared by all workers and surviving restarts
+REDIS_URL = os.environ.get('REDIS_URL')
+_redis = None
+if REDIS_URL:
+    try:
+        import redis
+        # Blocking pool: under load, callers wait for a free connection
+        # instead of opening unbounded sockets to Redis
+        _redis = redis.Redis(connection_pool=redis.BlockingConnectionPool.from_url(
+            REDIS_URL, max_connections=50, decode_responses=True))
+        print("Redis cache enabled")
+    except ImportError:
+        print("REDIS_URL set but redis not installed — using in-process cache only (pip install redis to enable)")
+
+# Optional: without Redis, CACHE_DB=<path> puts the same entries in a local
+# SQLite file instead, so a restart (and every gunicorn worker on the host)
+# starts from a warm cache. Unset, there is no shared cache.
+_sqlite = None
+_sqlite_lock = threading.Lock()
+CACHE_DB = os.environ.get('CACHE_DB')
+if _redis is None and CACHE_DB:
+    try:
+        _sqlite = sqlite3.connect(CACHE_DB, timeout=5, check_same_thread=False)
+        _sqlite.execute('PRAGMA journal_mode=WAL')    # workers read while one writes
+        _sqlite.execute('PRAGMA synchronous=NORMAL')
+        with _sqlite:
+            _sqlite.execute('CREATE TABLE IF NOT EXISTS cache '
+                            '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)')
+            _sqlite.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        print(f"SQLite cache enabled ({CACHE_DB})")
+    except sqlite3.Error as e:
+        print(f"SQLite cache unavailable ({e}) — using in-process cache only")
+        _sqlite = None
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson: faster on float-heavy payloads, and
+    serializes NumPy scalars/arrays natively (NaN becomes null)."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        """jsonify(); packed as MessagePack instead when the client prefers it.
+        Notes on g whether the payload is an error and what the ETag should
+        cover (the payload minus its top-level 'timestamp'), for _conditional_get()."""
+        obj = self._prepare_response_obj(args, kwargs)
+        g.error_payload = isinstance(obj, dict) and 'error' in obj
+        g.etag_payload = obj
+        if isinstance(obj, dict) and 'timestamp' in obj:
+            g.etag_payload = {k: v for k, v in obj.items() if k != 'timestamp'}
+        if not MSGPACK_AVAILABLE:
+            return self._app.response_class(self.dumps(obj), mimetype='application/json')
+        if request.accept_mimetypes.best_match(MSGPACK_MIMETYPES) == 'application/msgpack':
+            response = self._app.response_class(
+                msgpack.packb(obj, default=_msgpack_default), mimetype='application/msgpack')
+        else:
+            response = self._app.response_class(self.dumps(obj), mimetype='application/json')
+        response.vary.add('Accept')
+        return response
+
+
+MSGPACK_MIMETYPES = ['application/json', 'application/msgpack']  # JSON wins ties (*/*)
+
+
+def _msgpack_default(obj):
+    """NumPy values (jsonify payloads may carry them) as plain Python types."""
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    raise TypeError(f"Cannot serialize {type(obj).__name__} to MessagePack")
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 
+# Compress JSON responses (history payloads shrink 5–10×)
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 500
+app.config['COMPRESS_MIMETYPES'] = ['application/json', 'application/msgpack']
+Compress(app)
+
 # Cache for reducing API calls
 price_cache = OrderedDict()          # LRU cache
 exchange_rate_cache = {}
-news_cache = {}
+news_cache = OrderedDict()           # LRU cache, keyed news_<symbol>
+_meta_cache = {}                     # symbol → (timestamp, {'name', 'currency'})
+_negative_cache = OrderedDict()      # symbol → (timestamp, error data) of the last failed fetch
 CACHE_DURATION = 300                 # 5 minutes (was 60s)
 MAX_CACHE_SIZE = 500                 # LRU eviction threshold
+MAX_NEWS_CACHE_SIZE = 200            # same for news_cache
 EXCHANGE_RATE_CACHE_DURATION = 3600  # 1 hour for exchange rates
 NEWS_CACHE_DURATION = 1800           # 30 minutes for news
-
-# Rate limiting
-last_request_time = {}
-MIN_REQUEST_INTERVAL = 0.5  # 500ms between requests to same symbol
+HISTORY_CACHE_DURATION = 3600        # 1 hour for on-disk historical bars
+META_CACHE_DURATION = 86400          # 24 hours for name / currency
+STALE_CACHE_DURATION = 86400         # last-known-good prices served when upstream fails
+NEGATIVE_CACHE_DURATION = 60         # failed symbols (unknown / delisted) are not refetched sooner
+PRICE_SWR_WINDOW = 60                # seconds past CACHE_DURATION a price is still served
+                                     # while it is refreshed in the background
+NEWS_SWR_WINDOW = 300                # same for news, past NEWS_CACHE_DURATION
+FETCH_LOCK_TTL = 5                   # max seconds one worker holds a Redis fetch lock
+FETCH_LOCK_POLL = 0.05               # how often waiting workers re-check the cache
+
+# Rate limiting: at most RATE_LIMIT_MAX upstream fetches per symbol in any
+# RATE_LIMIT_WINDOW seconds (shared across workers through Redis when set)
+RATE_LIMIT_MAX = 2
+RATE_LIMIT_WINDOW = 1.0
+_rate_windows = {}          # symbol → deque of time.monotonic() fetch times (no Redis)
+_rate_lock = threading.Lock()
+
+# Browser / CDN caching of GET responses: endpoint → Cache-Control max-age (seconds)
+HTTP_CACHE_MAX_AGE = {
+    'get_stock_price': 30,
+    'get_major_indices': 30,
+    'get_stock_history': 300,
+    'get_exchange_rate': 300,
+    'get_stock_news': 300,
+}
+HTTP_CACHEABLE_MIMETYPES = ('application/json', 'application/msgpack')
+
+# Index page, served from memory (see serve_index)
+INDEX_HTML_PATH = os.path.join(os.path.dirname(__file__), 'stock-portfolio-optimized.html')
+INDEX_MAX_AGE = 3600
+_index_page = None                   # (etag, body, gzip body), read on first request
+
+# Background refresh of frequently requested symbols
+REFRESH_INTERVAL = CACHE_DURATION - 60   # re-fetch just before entries expire
+HOT_REFRESH_LIMIT = 50                   # most-requested symbols kept warm
+HOT_TRACK_MAX = 1000                     # symbols counted at all (LRU beyond that)
+_hot_symbols = OrderedDict()             # symbol → request count, least recent first
+_hot_lock = threading.Lock()
+
+# Taiwan listings: .TW (TWSE) and .TWO (TPEx) suffixes
+_TW_RE = re.compile(r'\.TWO?$', re.IGNORECASE)
+
+# Ticker syntax: AAPL, 2330.TW, BRK-B, ^TWII, TWD=X
+_SYMBOL_CHARS = frozenset(string.ascii_letters + string.digits + '.-^=')
+MAX_SYMBOL_LEN = 20
+
+# yf.download() packs this many symbols into one upstream request
+YF_DOWNLOAD_CHUNK = 20
+_download_lock = threading.Lock()    # serializes yf.download() (see _download_history)
+
+# Process-wide budget for requests to Yahoo: bursts of up to UPSTREAM_BURST
+# go straight out, the long-run rate stays under UPSTREAM_RATE per second
+UPSTREAM_BURST = 20
+UPSTREAM_RATE = 5.0
+# ...and at most UPSTREAM_MAX_INFLIGHT of them are open at once, however
+# many executor threads / gevent greenlets are asking
+UPSTREAM_MAX_INFLIGHT = 8
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously on the monotonic clock."""
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Take one token, sleeping until one is available."""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = (1 - self.tokens) / self.rate
+            time.sleep(wait_for)
+
+    def penalize(self):
+        """Upstream said 429: drain the bucket so callers back off for a while."""
+        with self.lock:
+            self._refill()
+            self.tokens = min(-1, self.tokens - self.rate)
+
+
+YAHOO_BUCKET = TokenBucket(UPSTREAM_BURST, UPSTREAM_RATE)
+UPSTREAM_SEM = threading.BoundedSemaphore(UPSTREAM_MAX_INFLIGHT)
+
+
+class _RateLimitedAdapter(HTTPAdapter):
+    """HTTPAdapter that spends a YAHOO_BUCKET token and holds an UPSTREAM_SEM
+    slot per request sent (cache hits from requests-cache never get here)
+    and backs off on HTTP 429. The slot is held until the body has been
+    downloaded, not just the headers."""
+
+    def send(self, request, **kwargs):
+        YAHOO_BUCKET.acquire()
+        with UPSTREAM_SEM:
+            response = super().send(request, **kwargs)
+            if not kwargs.get('stream'):
+                response.content  # read the body (Session.send would, after us)
+        if response.status_code == 429:
+            YAHOO_BUCKET.penalize()
+        return response
+
+
+# Transport-level retries for dropped connections and 5xx on GETs. 429 is
+# left to YAHOO_BUCKET / _retry(), which back off far longer than this.
+UPSTREAM_RETRY = Retry(total=2, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504],
+                       allowed_methods=['GET'], raise_on_status=False)
+
+# One keep-alive connection pool shared by every yfinance / HTTP call, so
+# repeated requests to Yahoo skip the TCP + TLS handshake. yfinance keeps a
+# single process-wide session (each Ticker(session=...) replaces it), so
+# this is the only session ever handed to yfinance.
+#
+# Optional: with requests-cache it also persists Yahoo chart responses for
+# chart ranges (1mo, 1y, ...) in SQLite, so chart and portfolio-history
+# requests survive restarts without refetching. The 1d/5d ranges behind live
+# prices, cookie/crumb and quote calls are never cached.
+_HISTORY_CHART_RE = re.compile(r'/v8/finance/chart/[^?]*\?(?:.*&)?range=(?!1d|5d)')
+try:
+    from requests_cache import CachedSession, DO_NOT_CACHE
+    SESSION = CachedSession(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'http_cache'),
+        backend='sqlite',
+        allowable_methods=['GET'],
+        expire_after=DO_NOT_CACHE,
+        urls_expire_after={_HISTORY_CHART_RE: HISTORY_CACHE_DURATION},
+    )
+    print("requests-cache available — caching historical data on disk")
+except ImportError:
+    SESSION = requests.Session()
+    print("requests-cache not installed — historical data is not cached (pip install requests-cache to enable)")
+SESSION.mount('https://', _RateLimitedAdapter(pool_connections=20, pool_maxsize=50,
+                                              max_retries=UPSTREAM_RETRY))
+
+# Separate pool for Google News RSS, with the browser User-Agent it expects
+NEWS_SESSION = requests.Session()
+NEWS_SESSION.headers.update({
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+})
+NEWS_SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=32,
+                                           max_retries=UPSTREAM_RETRY))
+
+# Plain pool for the non-Yahoo exchange-rate fallback (open.er-api.com), so
+# it spends no YAHOO_BUCKET token or UPSTREAM_SEM slot
+FX_SESSION = requests.Session()
+FX_SESSION.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4,
+                                         max_retries=UPSTREAM_RETRY))
+
+# Shared pool for fanning out independent network-bound fetches. Its tasks
+# never wait on EXECUTOR themselves; background revalidation, which does
+# fan out, gets its own pool so a busy EXECUTOR cannot starve (or be
+# starved by) it
+EXECUTOR = ThreadPoolExecutor(max_workers=16)
+REVALIDATE_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+_cache_lock = threading.Lock()      # guards price_cache / _negative_cache (OrderedDict is not thread-safe)
+_news_cache_lock = threading.Lock() # guards news_cache
+_price_inflight = {}                # symbol → Future of the price fetch in progress
+_price_inflight_lock = threading.Lock()
+_news_refreshing = set()            # symbols with a background news refresh running
+_news_refresh_lock = threading.Lock()
+PRICE_FETCH_TIMEOUT = 30            # seconds to wait for another request's price fetch
+_fx_lock = threading.Lock()         # guards _fx_inflight
+_fx_inflight = None                 # Future of the exchange-rate fetch in progress
+FX_FETCH_TIMEOUT = 15               # seconds to wait for a shared exchange-rate fetch
+_news_inflight = {}                 # symbol → Future of the news fetch in progress
+_news_inflight_lock = threading.Lock()
+NEWS_FETCH_TIMEOUT = 20             # seconds to wait for a shared news fetch
+FANOUT_TIMEOUT = 15                 # overall deadline for one parallel per-symbol fan-out
 
 
 # ── Cache helpers ────────────────────────────────────────────────────────────
+#
+# price_cache / news_cache / exchange_rate_cache are the per-process L1.
+# When REDIS_URL is configured, entries are also written to Redis with SETEX
+# so every worker shares them; Redis keys are versioned (v1:price:<symbol>,
+# v1:news:<symbol>, v1:fx:USDTWD) to allow schema changes. Without Redis,
+# CACHE_DB keeps the same keys in a SQLite table instead. _shared_get /
+# _shared_mget / _shared_set* front whichever of the two is configured (and
+# do nothing when neither is); locks, rate limits and the hot set are
+# Redis-only and otherwise per-process.
+
+def _sqlite_mget(keys):
+    """Return {key: raw value} for unexpired keys in the SQLite cache."""
+    try:
+        with _sqlite_lock:
+            rows = _sqlite.execute(
+                f"SELECT key, value FROM cache WHERE expires > ? AND key IN ({','.join('?' * len(keys))})",
+                (time.time(), *keys)).fetchall()
+    except sqlite3.Error as e:
+        print(f"  SQLite read ({len(keys)} keys) failed: {e}")
+        return {}
+    return dict(rows)
+
+
+def _sqlite_set_many(cached_time, entries):
+    """Upsert every {key: (ttl, data)} in one SQLite transaction."""
+    now = time.time()
+    rows = [(key, _shared_encode(cached_time, data), now + ttl)
+            for key, (ttl, data) in entries.items()]
+    try:
+        with _sqlite_lock, _sqlite:
+            _sqlite.executemany('INSERT OR REPLACE INTO cache VALUES (?, ?, ?)', rows)
+    except sqlite3.Error as e:
+        print(f"  SQLite write ({len(rows)} keys) failed: {e}")
+
+
+def _shared_get(key):
+    """Return (timestamp, data) stored under key in the shared cache, or None."""
+    if _redis is None:
+        return _shared_mget([key]).get(key)
+    try:
+        raw = _redis.get(key)
+    except Exception as e:
+        print(f"  Redis GET {key} failed: {e}")
+        return None
+    if raw is None:
+        return None
+    return _shared_decode(raw)
+
+
+def _shared_decode(raw):
+    entry = orjson.loads(raw)
+    return datetime.fromisoformat(entry['ts']), entry['data']
+
+
+def _shared_encode(cached_time, data):
+    return orjson.dumps({'ts': cached_time.isoformat(), 'data': data},
+                        option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _shared_mget(keys):
+    """Look up keys in one round trip (MGET / one SELECT); returns
+    {key: (timestamp, data)} for hits."""
+    if not keys:
+        return {}
+    if _redis is None:
+        if _sqlite is None:
+            return {}
+        return {key: _shared_decode(raw) for key, raw in _sqlite_mget(keys).items()}
+    try:
+        raws = _redis.mget(keys)
+    except Exception as e:
+        print(f"  Redis MGET ({len(keys)} keys) failed: {e}")
+        return {}
+    return {key: _shared_decode(raw) for key, raw in zip(keys, raws) if raw is not None}
+
+
+def _shared_set(key, ttl, cached_time, data):
+    """Store (timestamp, data) under key for ttl seconds; errors are logged and ignored."""
+    if _redis is None:
+        _shared_set_many(cached_time, {key: (ttl, data)})
+        return
+    try:
+        _redis.setex(key, ttl, _shared_encode(cached_time, data))
+    except Exception as e:
+        print(f"  Redis SETEX {key} failed: {e}")
+
+
+def _shared_set_many(cached_time, entries):
+    """Store every {key: (ttl, data)} in entries in one round trip
+    (pipelined SETEX / one SQLite transaction)."""
+    if not entries:
+        return
+    if _redis is None:
+        if _sqlite is not None:
+            _sqlite_set_many(cached_time, entries)
+        return
+    try:
+        pipe = _redis.pipeline(transaction=False)
+        for key, (ttl, data) in entries.items():
+            pipe.setex(key, ttl, _shared_encode(cached_time, data))
+        pipe.execute()
+    except Exception as e:
+        print(f"  Redis pipelined SETEX ({len(entries)} keys) failed: {e}")
+
+
+def _acquire_fetch_lock(key, ttl=FETCH_LOCK_TTL):
+    """SET key NX EX; True if this worker should fetch. Always True without Redis."""
+    if _redis is None:
+        return True
+    try:
+        return bool(_redis.set(key, '1', nx=True, ex=ttl))
+    except Exception as e:
+        print(f"  Redis lock {key} failed: {e}")
+        return True
+
+
+def _release_fetch_lock(key):
+    """Drop a lock taken by _acquire_fetch_lock()."""
+    if _redis is None:
+        return
+    try:
+        _redis.delete(key)
+    except Exception as e:
+        print(f"  Redis unlock {key} failed: {e}")
+
+
+def _allow_upstream(symbol):
+    """
+    Sliding-window rate limit for upstream fetches of symbol. Records the
+    attempt and returns True if it is within the budget.
+    """
+    if _redis is not None:
+        key = f'v1:rl:{symbol}'
+        now = time.time()
+        try:
+            pipe = _redis.pipeline(transaction=True)
+            pipe.zremrangebyscore(key, 0, now - RATE_LIMIT_WINDOW)
+            pipe.zadd(key, {f'{now}:{os.getpid()}:{threading.get_ident()}': now})
+            pipe.zcard(key)
+            pipe.expire(key, int(RATE_LIMIT_WINDOW) + 1)
+            return pipe.execute()[2] <= RATE_LIMIT_MAX
+        except Exception as e:
+            print(f"  Redis rate limit {key} failed: {e}")
+
+    now = time.monotonic()
+    with _rate_lock:
+        window = _rate_windows.setdefault(symbol, deque())
+        while window and now - window[0] >= RATE_LIMIT_WINDOW:
+            window.popleft()
+        if len(window) >= RATE_LIMIT_MAX:
+            return False
+        window.append(now)
+        return True
+
+
+def _cache_peek(symbol):
+    """Return the in-process (timestamp, data) for symbol regardless of age, or None."""
+    with _cache_lock:
+        return price_cache.get(symbol)
+
+
+def _stale_get_many(symbols):
+    """
+    Last-known-good price data for symbols, whatever its age: the L1 entry
+    if still held, else the long-lived shared-cache copy. Each returned dict is
+    marked 'stale': True. Returns {symbol: data}.
+    """
+    found = {}
+    for symbol in symbols:
+        entry = _cache_peek(symbol)
+        if entry:
+            found[symbol] = entry[1]
+    misses = [symbol for symbol in symbols if symbol not in found]
+    remote = _shared_mget([f'v1:stale:price:{symbol}' for symbol in misses])
+    for symbol in misses:
+        entry = remote.get(f'v1:stale:price:{symbol}')
+        if entry:
+            found[symbol] = entry[1]
+    return {symbol: {**data, 'stale': True} for symbol, data in found.items()}
+
 
 def _cache_get(symbol):
     """Return (timestamp, data) if cache hit and still fresh, else None."""
-    if symbol not in price_cache:
-        return None
-    cached_time, cached_data = price_cache[symbol]
-    if (datetime.now() - cached_time).total_seconds() < CACHE_DURATION:
-        # Move to end (most-recently-used)
-        price_cache.move_to_end(symbol)
-        return cached_time, cached_data
-    return None
+    with _cache_lock:
+        if symbol in price_cache:
+            cached_time, cached_data = price_cache[symbol]
+            if (datetime.now() - cached_time).total_seconds() < CACHE_DURATION:
+                # Move to end (most-recently-used)
+                price_cache.move_to_end(symbol)
+                return cached_time, cached_data
+
+    # L1 miss: another worker may already have fetched it
+    hit = _shared_get(f'v1:price:{symbol}')
+    if hit:
+        with _cache_lock:
+            price_cache[symbol] = hit
+            price_cache.move_to_end(symbol)
+    return hit
+
+
+def _cache_get_many(symbols):
+    """Batch _cache_get(): {symbol: (timestamp, data)} for fresh entries.
+    L1 misses are looked up in the shared cache in one round trip."""
+    hits = {}
+    now = datetime.now()
+    with _cache_lock:
+        for symbol in symbols:
+            entry = price_cache.get(symbol)
+            if entry and (now - entry[0]).total_seconds() < CACHE_DURATION:
+                price_cache.move_to_end(symbol)
+                hits[symbol] = entry
+
+    misses = [symbol for symbol in symbols if symbol not in hits]
+    remote = _shared_mget([f'v1:price:{symbol}' for symbol in misses])
+    if remote:
+        with _cache_lock:
+            for symbol in misses:
+                entry = remote.get(f'v1:price:{symbol}')
+                if entry:
+                    price_cache[symbol] = hits[symbol] = entry
+                    price_cache.move_to_end(symbol)
+    return hits
 
 
 def _cache_set(symbol, data):
     """Insert/update cache entry; evict oldest when over MAX_CACHE_SIZE."""
-    price_cache[symbol] = (datetime.now(), data)
-    price_cache.move_to_end(symbol)
-    while len(price_cache) > MAX_CACHE_SIZE:
-        price_cache.popitem(last=False)  # remove oldest
+    _cache_set_many({symbol: data})
+
+
+def _cache_set_many(entries):
+    """Cache every {symbol: data} in entries; shared-cache writes go in one round trip."""
+    now = datetime.now()
+    with _cache_lock:
+        for symbol, data in entries.items():
+            price_cache[symbol] = (now, data)
+            price_cache.move_to_end(symbol)
+            _negative_cache.pop(symbol, None)
+        while len(price_cache) > MAX_CACHE_SIZE:
+            price_cache.popitem(last=False)  # remove oldest
+    # Each price is also kept as a last-known-good copy for STALE_CACHE_DURATION
+    shared_entries = {}
+    for symbol, data in entries.items():
+        shared_entries[f'v1:price:{symbol}'] = (CACHE_DURATION, data)
+        shared_entries[f'v1:stale:price:{symbol}'] = (STALE_CACHE_DURATION, data)
+    _shared_set_many(now, shared_entries)
+
+
+def _negative_get_many(symbols):
+    """{symbol: error data} for symbols whose last fetch failed less than
+    NEGATIVE_CACHE_DURATION ago (in-process only)."""
+    now = datetime.now()
+    hits = {}
+    with _cache_lock:
+        for symbol in symbols:
+            entry = _negative_cache.get(symbol)
+            if entry and (now - entry[0]).total_seconds() < NEGATIVE_CACHE_DURATION:
+                hits[symbol] = entry[1]
+    return hits
+
+
+def _negative_set_many(entries):
+    """Remember every {symbol: error data} as failed; same LRU bound as price_cache."""
+    now = datetime.now()
+    with _cache_lock:
+        for symbol, data in entries.items():
+            _negative_cache[symbol] = (now, data)
+            _negative_cache.move_to_end(symbol)
+        while len(_negative_cache) > MAX_CACHE_SIZE:
+            _negative_cache.popitem(last=False)
+
+
+def _news_cache_peek(symbol):
+    """Return the in-process (timestamp, news_items) entry regardless of age."""
+    with _news_cache_lock:
+        entry = news_cache.get(f"news_{symbol}")
+        if entry:
+            news_cache.move_to_end(f"news_{symbol}")
+        return entry
+
+
+def _news_cache_put(entries):
+    """Store {symbol: (timestamp, news_items)} in-process; evict oldest when
+    over MAX_NEWS_CACHE_SIZE."""
+    with _news_cache_lock:
+        for symbol, entry in entries.items():
+            news_cache[f"news_{symbol}"] = entry
+            news_cache.move_to_end(f"news_{symbol}")
+        while len(news_cache) > MAX_NEWS_CACHE_SIZE:
+            news_cache.popitem(last=False)
+
+
+def _news_cache_get(symbol):
+    """Return (timestamp, news_items) if cached and still fresh, else None."""
+    hit = _news_cache_peek(symbol)
+    if hit and (datetime.now() - hit[0]).total_seconds() < NEWS_CACHE_DURATION:
+        return hit
+    hit = _shared_get(f'v1:news:{symbol}')
+    if hit:
+        _news_cache_put({symbol: hit})
+    return hit
+
+
+def _news_cache_get_many(symbols):
+    """Batch _news_cache_get(): {symbol: (timestamp, news_items)} for fresh
+    entries, with one shared-cache lookup for the L1 misses."""
+    hits = {}
+    now = datetime.now()
+    for symbol in symbols:
+        entry = _news_cache_peek(symbol)
+        if entry and (now - entry[0]).total_seconds() < NEWS_CACHE_DURATION:
+            hits[symbol] = entry
+
+    misses = [symbol for symbol in symbols if symbol not in hits]
+    remote = _shared_mget([f'v1:news:{symbol}' for symbol in misses])
+    found = {symbol: remote[f'v1:news:{symbol}'] for symbol in misses
+             if f'v1:news:{symbol}' in remote}
+    _news_cache_put(found)
+    hits.update(found)
+    return hits
+
+
+def _news_cache_set(symbol, news_items):
+    """Cache news items for symbol in-process and in the shared cache."""
+    now = datetime.now()
+    _news_cache_put({symbol: (now, news_items)})
+    _shared_set(f'v1:news:{symbol}', NEWS_CACHE_DURATION, now, news_items)
+
+
+def _news_cache_set_many(entries):
+    """Cache every {symbol: news_items}; shared-cache writes go in one round trip."""
+    now = datetime.now()
+    _news_cache_put({symbol: (now, news_items) for symbol, news_items in entries.items()})
+    _shared_set_many(now, {f'v1:news:{symbol}': (NEWS_CACHE_DURATION, items)
+                          for symbol, items in entries.items()})
+
+
+def _gather(futures, timeout=FANOUT_TIMEOUT):
+    """
+    Wait for {key: Future} with one overall deadline, so a single hung
+    upstream call cannot hold up a whole batch.
+    Returns (results {key: value}, errors {key: message}).
+    """
+    done, _ = wait(futures.values(), timeout=timeout)
+    results, errors = {}, {}
+    for key, future in futures.items():
+        if future not in done:
+            errors[key] = f'Timed out after {timeout}s'
+        elif future.exception() is not None:
+            errors[key] = str(future.exception())
+        else:
+            results[key] = future.result()
+    return results, errors
 
 
 # ── Retry helper ─────────────────────────────────────────────────────────────
@@ -90,79 +729,179 @@ def _retry(func, max_retries=3, base_delay=0.5):
             time.sleep(delay)
 
 
+# ── Multi-symbol history helper ──────────────────────────────────────────────
+
+def _chunked(items, size):
+    """Yield successive slices of items with at most size elements."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _download_history(symbols, period):
+    """
+    Fetch history for many symbols via yf.download(), YF_DOWNLOAD_CHUNK per call.
+    Returns {symbol: DataFrame}; symbols without data are left out.
+    """
+    symbols = list(dict.fromkeys(symbols))  # de-duplicate, keep order
+    frames = {}
+    for chunk in _chunked(symbols, YF_DOWNLOAD_CHUNK):
+        # auto_adjust=True keeps 'Close' identical to Ticker.history().
+        # yf.download() collects results in the module-global shared._DFS,
+        # which each call resets, so overlapping calls must not interleave
+        with _download_lock:
+            df = yf.download(chunk, period=period, group_by='ticker', auto_adjust=True,
+                             threads=True, progress=False, session=SESSION)
+        if df.empty:
+            continue
+        for symbol in chunk:
+            if df.columns.nlevels > 1:
+                key = symbol.upper()  # yf.download() upper-cases tickers
+                if key not in df.columns.get_level_values(0):
+                    continue
+                sym_data = df[key]
+            else:
+                sym_data = df  # single-symbol downloads come back un-nested
+            sym_data = sym_data.dropna(subset=['Close'])
+            if not sym_data.empty:
+                frames[symbol] = sym_data
+    return frames
+
+
+def _trading_days(hist):
+    """
+    Return hist's index as tz-naive calendar dates in exchange-local time,
+    so frames from different markets (or with/without tz) align by date.
+    """
+    index = hist.index
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.normalize()
+
+
+def _daily_change(hist):
+    """
+    Return (last close, change, change %) from a history frame.
+    Reads the Close column into NumPy once instead of two pandas lookups.
+    """
+    closes = hist['Close'].to_numpy()
+    current = closes[-1]
+    if len(closes) >= 2:
+        prev = closes[-2]
+        change = current - prev
+        return current, change, (change / prev) * 100
+    return current, 0, 0
+
+
 # ── Per-symbol fetch helpers ─────────────────────────────────────────────────
 
+def _yq_quotes(symbols):
+    """
+    Fetch quotes for one or many symbols in a single Yahoo v7/finance/quote
+    call (yahooquery Ticker.quotes). Returns {symbol: quote dict}.
+    """
+    YAHOO_BUCKET.acquire()  # yahooquery uses its own session
+    with UPSTREAM_SEM:
+        quotes = YQTicker(symbols).quotes
+    return quotes if isinstance(quotes, dict) else {}  # error → message string
+
+
+def _quote_change(d):
+    """Return (price, change, change %) from a v7 quote, or None without a price."""
+    if not isinstance(d, dict) or d.get('regularMarketPrice') is None:
+        return None
+    # v7 quote reports regularMarketChangePercent already in percent (1.23 = 1.23%)
+    return (d['regularMarketPrice'],
+            d.get('regularMarketChange') or 0,
+            d.get('regularMarketChangePercent') or 0)
+
+
+def _meta_get(symbol):
+    """Return cached {'name', 'currency'} for symbol if younger than a day, else None."""
+    entry = _meta_cache.get(symbol)
+    if entry and (datetime.now() - entry[0]).total_seconds() < META_CACHE_DURATION:
+        return entry[1]
+    return None
+
+
+def _meta_from_quote(symbol, d):
+    """Cache name/currency carried by a v7 quote and return them."""
+    meta = {
+        'name': d.get('shortName') or d.get('longName') or symbol,
+        'currency': d.get('currency')
+    }
+    _meta_cache[symbol] = (datetime.now(), meta)
+    return meta
+
+
 def _fetch_price_yq(symbol):
     """Fetch single price via yahooquery. Returns dict or None on failure."""
-    ticker = YQTicker(symbol)
-    price_data = ticker.price
-    if not price_data or symbol not in price_data:
-        return None
-    d = price_data[symbol]
-    if not isinstance(d, dict):
-        return None
-    price = d.get('regularMarketPrice')
-    if price is None:
+    d = _yq_quotes(symbol).get(symbol)
+    fields = _quote_change(d)
+    if fields is None:
         return None
-    change = d.get('regularMarketChange') or 0
-    # yahooquery regularMarketChangePercent is a decimal (e.g. 0.0123 = 1.23%)
-    change_pct = (d.get('regularMarketChangePercent') or 0) * 100
-    name = d.get('shortName') or d.get('longName') or symbol
+    price, change, change_pct = fields
+    meta = _meta_from_quote(symbol, d)
     return {
         'symbol': symbol,
         'price': round(float(price), 2),
         'change': round(float(change), 2),
         'changePercent': round(float(change_pct), 2),
-        'name': name,
+        'name': meta['name'],
+        'currency': meta['currency'],
         'timestamp': datetime.now().isoformat()
     }
 
 
 def _fetch_price_yf(symbol):
     """Fetch single price via yfinance history(). Returns dict or raises."""
-    ticker = yf.Ticker(symbol)
+    ticker = yf.Ticker(symbol, session=SESSION)
     hist = ticker.history(period='5d')
     if hist.empty:
         return {'error': 'No data available for ' + symbol}
-    current_price = hist['Close'].iloc[-1]
-    if len(hist) >= 2:
-        prev_close = hist['Close'].iloc[-2]
-        change = current_price - prev_close
-        change_pct = (change / prev_close) * 100
-    else:
-        change = 0
-        change_pct = 0
-    name = symbol
-    try:
-        name = ticker.fast_info.get('longName', symbol)
-    except Exception:
-        pass
+    current_price, change, change_pct = _daily_change(hist)
+
+    # Name/currency don't change intraday: resolve once a day. fast_info's
+    # currency comes from the history metadata fetched above (no extra call);
+    # the display name is filled in whenever a yahooquery quote succeeds.
+    meta = _meta_get(symbol)
+    if meta is None:
+        currency = None
+        try:
+            currency = ticker.fast_info['currency']
+        except Exception:
+            pass
+        meta = {'name': symbol, 'currency': currency}
+        _meta_cache[symbol] = (datetime.now(), meta)
+
     return {
         'symbol': symbol,
         'price': round(float(current_price), 2),
         'change': round(float(change), 2),
         'changePercent': round(float(change_pct), 2),
-        'name': name,
+        'name': meta['name'],
+        'currency': meta['currency'],
         'timestamp': datetime.now().isoformat()
     }
 
 
-def fetch_price(symbol):
+def _fetch_price_uncached(symbol):
     """
     Dual-path fetch: yahooquery first (with retry), yfinance as fallback.
-    Always returns a dict (never raises).
+    Writes the result to the cache. Always returns a dict (never raises).
     """
-    # 1. Cache check
-    hit = _cache_get(symbol)
-    if hit:
-        return hit[1]
-
-    # 2. Rate limiting
-    now = datetime.now()
-    if symbol in last_request_time:
-        elapsed = (now - last_request_time[symbol]).total_seconds()
-        if elapsed < MIN_REQUEST_INTERVAL:
-            time.sleep(MIN_REQUEST_INTERVAL - elapsed)
+    # 1. Failed recently: don't go upstream again until NEGATIVE_CACHE_DURATION
+    #    (checked first, so it doesn't use up a rate-limit slot)
+    failed = _negative_get_many([symbol])
+    if failed:
+        return _stale_get_many([symbol]).get(symbol, failed[symbol])
+
+    # 2. Rate limiting: over budget, serve the last known value (marked
+    #    stale) rather than blocking the worker; with nothing to serve,
+    #    fetch anyway
+    if not _allow_upstream(symbol):
+        stale = _stale_get_many([symbol]).get(symbol)
+        if stale:
+            return stale
 
     data = None
 
@@ -177,10 +916,12 @@ def fetch_price(symbol):
             data = None
 
     # 4. Fallback: yfinance
+    raised = False
     if data is None:
         try:
             data = _retry(lambda: _fetch_price_yf(symbol))
         except Exception as e:
+            raised = True
             data = {
                 'error': str(e),
                 'symbol': symbol,
@@ -191,20 +932,390 @@ def fetch_price(symbol):
                 'timestamp': datetime.now().isoformat()
             }
 
-    last_request_time[symbol] = datetime.now()
+    # 5. Both paths failed: last known good beats an error payload. An
+    #    answer of "no data" (unknown / delisted symbol) is kept briefly in
+    #    the negative cache; exceptions and timeouts are retried next time.
+    if 'error' in data:
+        if not raised:
+            _negative_set_many({symbol: data})
+        return _stale_get_many([symbol]).get(symbol, data)
+
     _cache_set(symbol, data)
     return data
 
 
+def _claim_inflight(symbols):
+    """
+    Split symbols into those this caller must fetch (a new Future is
+    registered for each) and those another request is already fetching.
+    Returns (owned {symbol: Future}, waiting {symbol: Future}).
+    """
+    owned, waiting = {}, {}
+    with _price_inflight_lock:
+        for symbol in symbols:
+            future = _price_inflight.get(symbol)
+            if future is None:
+                owned[symbol] = _price_inflight[symbol] = Future()
+            else:
+                waiting[symbol] = future
+    return owned, waiting
+
+
+def _resolve_inflight(owned, results):
+    """Publish results to everyone waiting on owned and drop the entries."""
+    with _price_inflight_lock:
+        for symbol in owned:
+            _price_inflight.pop(symbol, None)
+    for symbol, future in owned.items():
+        future.set_result(results.get(symbol, {'error': 'Fetch failed'}))
+
+
+def _await_inflight(waiting):
+    """Collect the results of fetches owned by other requests."""
+    results = {}
+    for symbol, future in waiting.items():
+        try:
+            results[symbol] = future.result(timeout=PRICE_FETCH_TIMEOUT)
+        except Exception as e:
+            results[symbol] = {'error': str(e)}
+    return results
+
+
+def fetch_price(symbol):
+    """
+    Cached price lookup. On a miss, only one request per process (in-flight
+    Future) and one worker overall (Redis fetch lock) goes upstream; the
+    others wait for its result.
+    Always returns a dict (never raises).
+    """
+    # 1. Cache check
+    hit = _cache_get(symbol)
+    if hit:
+        return hit[1]
+
+    # 2. Recently expired: serve it now, refresh in the background
+    recent = _cache_get_revalidating([symbol])
+    if recent:
+        return recent[symbol]
+
+    # 3. In-process single-flight: join a fetch already in progress
+    owned, waiting = _claim_inflight([symbol])
+    if waiting:
+        return _await_inflight(waiting)[symbol]
+
+    results = {}
+    try:
+        results[symbol] = _fetch_price_owned(symbol)
+        return results[symbol]
+    finally:
+        _resolve_inflight(owned, results)
+
+
+def _fetch_price_owned(symbol):
+    """fetch_price() body for the request holding the symbol's in-flight slot."""
+    # The previous owner may have filled the cache just before we claimed
+    hit = _cache_get(symbol)
+    if hit:
+        return hit[1]
+
+    # 4. Stampede protection across workers
+    lock_key = f'v1:lock:price:{symbol}'
+    if not _acquire_fetch_lock(lock_key):
+        for _ in range(int(FETCH_LOCK_TTL / FETCH_LOCK_POLL)):
+            time.sleep(FETCH_LOCK_POLL)
+            hit = _cache_get(symbol)
+            if hit:
+                return hit[1]
+        # Lock holder is slow or gone — fetch it ourselves
+        return _fetch_price_uncached(symbol)
+
+    try:
+        return _fetch_price_uncached(symbol)
+    finally:
+        _release_fetch_lock(lock_key)
+
+
+def _fetch_prices_coalesced(symbols):
+    """
+    _fetch_prices_uncached() for the symbols nobody else is fetching right
+    now; symbols already in flight (from single or batch requests) are
+    awaited instead of fetched twice. Returns {symbol: data}.
+    """
+    owned, waiting = _claim_inflight(dict.fromkeys(symbols))
+    results = {}
+    try:
+        if owned:
+            # Entries may have landed between the caller's cache check and the claim
+            results = {s: hit[1] for s, hit in _cache_get_many(list(owned)).items()}
+            misses = [s for s in owned if s not in results]
+            if misses:
+                results.update(_fetch_prices_uncached(misses))
+    finally:
+        _resolve_inflight(owned, results)
+    results.update(_await_inflight(waiting))
+    return results
+
+
+def _cache_get_revalidating(symbols):
+    """
+    Stale-while-revalidate: entries at most PRICE_SWR_WINDOW seconds past
+    CACHE_DURATION are returned as they are, while one background fetch
+    replaces them (claimed through the in-flight map, so concurrent
+    callers never start a second one). Returns {symbol: data}.
+    """
+    now = datetime.now()
+    found = {}
+    for symbol in symbols:
+        entry = _cache_peek(symbol)
+        if entry and (now - entry[0]).total_seconds() < CACHE_DURATION + PRICE_SWR_WINDOW:
+            found[symbol] = entry[1]
+    if found:
+        owned, _ = _claim_inflight(found)
+        if owned:
+            REVALIDATE_EXECUTOR.submit(_revalidate_prices, owned)
+    return found
+
+
+def _revalidate_prices(owned):
+    """Background half of _cache_get_revalidating()."""
+    results = {}
+    try:
+        results = _fetch_prices_uncached(list(owned))
+    except Exception as e:
+        print(f"Background revalidation failed: {e}")
+    finally:
+        _resolve_inflight(owned, results)
+
+
+def _fetch_prices_uncached(symbols):
+    """
+    Fetch prices for symbols straight from upstream, bypassing the cache
+    read but writing every successful result to it in one batch.
+    Returns {symbol: data}.
+    Primary: yahooquery quotes; fallback: yf.download(), then per-symbol yfinance.
+    Symbols that failed within NEGATIVE_CACHE_DURATION are not refetched.
+    """
+    results = _negative_get_many(symbols)
+    symbols = [symbol for symbol in symbols if symbol not in results]
+
+    # ── Primary: yahooquery batch ──────────────────────────────────────────
+    yq_failed = []
+    if YAHOOQUERY_AVAILABLE and symbols:
+        try:
+            quote_map = _retry(lambda: _yq_quotes(symbols))
+            for symbol in symbols:
+                d = quote_map.get(symbol)
+                fields = _quote_change(d)
+                if fields is not None:
+                    price, change, change_pct = fields
+                    meta = _meta_from_quote(symbol, d)
+                    data = {
+                        'price': round(float(price), 2),
+                        'change': round(float(change), 2),
+                        'changePercent': round(float(change_pct), 2),
+                        'name': meta['name'],
+                        'currency': meta['currency']
+                    }
+                    results[symbol] = data
+                else:
+                    yq_failed.append(symbol)
+        except Exception as e:
+            print(f"yahooquery batch failed: {e}")
+            yq_failed = list(symbols)
+    else:
+        yq_failed = list(symbols)
+
+    # ── Fallback: yfinance multi-symbol download ───────────────────────────
+    if yq_failed:
+        try:
+            hist_map = _retry(lambda: _download_history(yq_failed, '5d'))
+
+            yf_failed = []
+            for symbol in yq_failed:
+                try:
+                    sym_data = hist_map.get(symbol)
+                    if sym_data is not None:
+                        cp, ch, ch_pct = _daily_change(sym_data)
+                        meta = _meta_get(symbol) or {}
+                        data = {
+                            'price': round(float(cp), 2),
+                            'change': round(float(ch), 2),
+                            'changePercent': round(float(ch_pct), 2),
+                            'name': meta.get('name', symbol),
+                            'currency': meta.get('currency')
+                        }
+                        results[symbol] = data
+                        continue
+                    yf_failed.append(symbol)
+                except Exception as e:
+                    print(f"Error processing {symbol} in yf batch: {e}")
+                    yf_failed.append(symbol)
+
+        except Exception as e:
+            print(f"yfinance download failed: {e}")
+            yf_failed = list(yq_failed)
+
+        # ── Last resort: individual yfinance, fetched in parallel ─────────
+        futures = {
+            symbol: EXECUTOR.submit(_retry, lambda s=symbol: _fetch_price_yf(s))
+            for symbol in yf_failed
+        }
+        fetched, errors = _gather(futures)
+        results.update(fetched)
+        results.update({symbol: {'error': message} for symbol, message in errors.items()})
+        # Upstream answered "no data" (as opposed to timing out or raising)
+        _negative_set_many({s: d for s, d in fetched.items() if 'error' in d})
+
+    _cache_set_many({s: d for s, d in results.items() if 'error' not in d})
+
+    # Serve last known good data for whatever still failed
+    failed = [s for s, d in results.items() if 'error' in d]
+    results.update(_stale_get_many(failed))
+    return results
+
+
+# ── Background refresher ─────────────────────────────────────────────────────
+
+def _valid_symbol(symbol):
+    """True if symbol looks like a ticker; checked per character against
+    _SYMBOL_CHARS, so malformed input never reaches Yahoo or the caches."""
+    return (isinstance(symbol, str) and 0 < len(symbol) <= MAX_SYMBOL_LEN
+            and _SYMBOL_CHARS.issuperset(symbol))
+
+
+def _hot_key(intervals_ago=0):
+    """Redis sorted set holding one REFRESH_INTERVAL's worth of request counts."""
+    return f'v1:hot:{int(time.time() // REFRESH_INTERVAL) - intervals_ago}'
+
+
+def _track_hot(symbols):
+    """Count requests per symbol so the refresher knows what to keep warm.
+    With Redis the counts go to a per-interval sorted set (v1:hot:<n>) shared
+    by all workers; each set expires after two intervals, so symbols nobody
+    asks for any more drop out instead of piling up all-time counts.
+    Both are capped at HOT_TRACK_MAX symbols: in-process the least recently
+    requested go first, in Redis the least requested this interval."""
+    counts = Counter(symbols)
+    with _hot_lock:
+        for symbol, n in counts.items():
+            _hot_symbols[symbol] = _hot_symbols.get(symbol, 0) + n
+            _hot_symbols.move_to_end(symbol)
+        while len(_hot_symbols) > HOT_TRACK_MAX:
+            _hot_symbols.popitem(last=False)
+    if _redis is not None:
+        key = _hot_key()
+        try:
+            pipe = _redis.pipeline(transaction=False)
+            for symbol, n in counts.items():
+                pipe.zincrby(key, n, symbol)
+            pipe.zremrangebyrank(key, 0, -HOT_TRACK_MAX - 1)
+            pipe.expire(key, 2 * REFRESH_INTERVAL)
+            pipe.execute()
+        except Exception as e:
+            print(f"  Redis ZINCRBY {key} failed: {e}")
+
+
+def _hot_list():
+    """The HOT_REFRESH_LIMIT most requested symbols, cluster-wide when possible.
+    In Redis that covers the current and the previous interval, so a refresh
+    right after a rollover still sees the last few minutes of traffic."""
+    if _redis is not None:
+        try:
+            pipe = _redis.pipeline(transaction=False)
+            for intervals_ago in (0, 1):
+                pipe.zrange(_hot_key(intervals_ago), 0, -1, withscores=True)
+            totals = Counter()
+            for pairs in pipe.execute():
+                totals.update(dict(pairs))
+            return [symbol for symbol, _ in totals.most_common(HOT_REFRESH_LIMIT)]
+        except Exception as e:
+            print(f"  Redis ZRANGE v1:hot failed: {e}")
+    with _hot_lock:
+        return heapq.nlargest(HOT_REFRESH_LIMIT, _hot_symbols, key=_hot_symbols.get)
+
+
+def _refresh_loop():
+    """Re-fetch the most requested symbols every REFRESH_INTERVAL, so their
+    cache entries are replaced before expiring and user requests stay hits.
+    With Redis, one worker per interval does the refresh for everyone."""
+    while True:
+        time.sleep(REFRESH_INTERVAL)
+        # Lock expires (not released) so other workers skip this interval
+        if not _acquire_fetch_lock('v1:lock:refresh', ttl=REFRESH_INTERVAL - 5):
+            continue
+        hot = _hot_list()
+        if not hot:
+            continue
+        try:
+            _fetch_prices_uncached(hot)
+        except Exception as e:
+            print(f"Background refresh failed: {e}")
+
+
 # ── Endpoints ────────────────────────────────────────────────────────────────
 
+@app.before_request
+def _stamp_request():
+    """One wall-clock timestamp per request, for response timestamps and the
+    endpoints' own TTL check (FX). The cache helpers read the clock themselves,
+    since the background refreshers call them outside any request."""
+    g.now = datetime.now()
+
+
+@app.after_request
+def _conditional_get(response):
+    """
+    ETag + Cache-Control for the cacheable GET endpoints; answers 304 with
+    no body when the client already holds the same payload. Registered
+    after Compress(app), so it runs first and hashes the uncompressed body.
+    Error payloads (some endpoints answer 200 with {'error': ...}) are not
+    tagged, so clients and CDNs don't hold on to failures.
+    The hash leaves out the payload's fetch 'timestamp': a refetch, or another
+    worker, that finds the same quote keeps the same ETag.
+    """
+    max_age = HTTP_CACHE_MAX_AGE.get(request.endpoint)
+    if (max_age is None or request.method != 'GET' or response.status_code != 200
+            or response.is_streamed or response.mimetype not in HTTP_CACHEABLE_MIMETYPES
+            or g.get('error_payload')):
+        return response
+
+    if 'etag_payload' in g:
+        etag_source = response.mimetype.encode() + orjson.dumps(
+            g.etag_payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    else:
+        etag_source = response.get_data()
+    etag = hashlib.blake2b(etag_source, digest_size=8).hexdigest()
+    cache_control = f'public, max-age={max_age}'
+
+    # flask-compress sends compressed bodies as "<etag>:<algorithm>"
+    client_tags = {
+        tag.strip().removeprefix('W/').strip('"').split(':')[0]
+        for tag in request.headers.get('If-None-Match', '').split(',')
+    }
+    if etag in client_tags:
+        not_modified = app.response_class(status=304)
+        not_modified.set_etag(etag)
+        not_modified.headers['Cache-Control'] = cache_control
+        not_modified.vary.add('Accept-Encoding')
+        if MSGPACK_AVAILABLE:
+            not_modified.vary.add('Accept')
+        return not_modified
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
 @app.route('/api/stock/<symbol>', methods=['GET'])
 def get_stock_price(symbol):
     """
     Get current stock price and change.
     Supports both US stocks (AAPL) and Taiwan stocks (2330.TW)
     """
+    if not _valid_symbol(symbol):
+        return jsonify({'error': 'Invalid symbol'}), 400
     try:
+        _track_hot([symbol])
         data = fetch_price(symbol)
         return jsonify(data)
     except Exception as e:
@@ -222,108 +1333,32 @@ def get_stock_price(symbol):
 def get_batch_stocks():
     """
     Get multiple stock prices in one request — dual-path optimized.
-    Primary: yahooquery Ticker(symbols).price (single HTTP call)
-    Fallback: yf.Tickers() batch, then individual yf.Ticker() per symbol
+    Primary: yahooquery Ticker(symbols).quotes (single v7/finance/quote call)
+    Fallback: yf.download() multi-symbol, then individual yf.Ticker() per symbol
     Body: {"symbols": ["AAPL", "2330.TW", "TSLA"]}
     """
     try:
         req_data = request.get_json(silent=True) or {}
-        symbols = req_data.get('symbols', [])
+        requested = req_data.get('symbols', [])
+        symbols = [s for s in requested if _valid_symbol(s)]
+        rejected = {str(s): {'error': 'Invalid symbol'} for s in requested if not _valid_symbol(s)}
         if not symbols:
-            return jsonify({})
+            return jsonify(rejected)
 
-        results = {}
-        now = datetime.now()
+        _track_hot(symbols)
 
-        # Separate cached and non-cached symbols
-        uncached_symbols = []
-        for symbol in symbols:
-            hit = _cache_get(symbol)
-            if hit:
-                results[symbol] = hit[1]
-            else:
-                uncached_symbols.append(symbol)
+        # Separate cached and non-cached symbols; recently expired entries
+        # are served as they are and refreshed in the background
+        hits = _cache_get_many(symbols)
+        results = dict(rejected)
+        results.update({symbol: hits[symbol][1] for symbol in symbols if symbol in hits})
+        results.update(_cache_get_revalidating([s for s in symbols if s not in results]))
+        uncached_symbols = [symbol for symbol in symbols if symbol not in results]
 
         if not uncached_symbols:
             return jsonify(results)
 
-        # ── Primary: yahooquery batch ──────────────────────────────────────
-        yq_failed = []
-        if YAHOOQUERY_AVAILABLE:
-            try:
-                def _yq_batch():
-                    t = YQTicker(uncached_symbols)
-                    return t.price
-
-                price_map = _retry(_yq_batch)
-                for symbol in uncached_symbols:
-                    d = (price_map or {}).get(symbol)
-                    if isinstance(d, dict) and d.get('regularMarketPrice') is not None:
-                        price = d['regularMarketPrice']
-                        change = d.get('regularMarketChange') or 0
-                        change_pct = (d.get('regularMarketChangePercent') or 0) * 100
-                        data = {
-                            'price': round(float(price), 2),
-                            'change': round(float(change), 2),
-                            'changePercent': round(float(change_pct), 2)
-                        }
-                        _cache_set(symbol, data)
-                        results[symbol] = data
-                    else:
-                        yq_failed.append(symbol)
-            except Exception as e:
-                print(f"yahooquery batch failed: {e}")
-                yq_failed = list(uncached_symbols)
-        else:
-            yq_failed = list(uncached_symbols)
-
-        # ── Fallback: yfinance batch ───────────────────────────────────────
-        if yq_failed:
-            try:
-                def _yf_batch():
-                    return yf.Tickers(' '.join(yq_failed)).history(period='5d')
-
-                hist_data = _retry(_yf_batch)
-
-                yf_failed = []
-                for symbol in yq_failed:
-                    try:
-                        if symbol in hist_data.columns.get_level_values(1):
-                            sym_data = hist_data.xs(symbol, level=1, axis=1)
-                            if not sym_data.empty and 'Close' in sym_data.columns:
-                                cp = sym_data['Close'].iloc[-1]
-                                if len(sym_data) >= 2:
-                                    pc = sym_data['Close'].iloc[-2]
-                                    ch = cp - pc
-                                    ch_pct = (ch / pc) * 100
-                                else:
-                                    ch = ch_pct = 0
-                                data = {
-                                    'price': round(float(cp), 2),
-                                    'change': round(float(ch), 2),
-                                    'changePercent': round(float(ch_pct), 2)
-                                }
-                                _cache_set(symbol, data)
-                                results[symbol] = data
-                                continue
-                        yf_failed.append(symbol)
-                    except Exception as e:
-                        print(f"Error processing {symbol} in yf batch: {e}")
-                        yf_failed.append(symbol)
-
-            except Exception as e:
-                print(f"yfinance batch failed: {e}")
-                yf_failed = list(yq_failed)
-
-            # ── Last resort: individual yfinance ──────────────────────────
-            for symbol in yf_failed:
-                try:
-                    data = _retry(lambda s=symbol: _fetch_price_yf(s))
-                    _cache_set(symbol, data)
-                    results[symbol] = data
-                except Exception as e:
-                    results[symbol] = {'error': str(e)}
-
+        results.update(_fetch_prices_coalesced(uncached_symbols))
         return jsonify(results)
 
     except Exception as e:
@@ -338,6 +1373,19 @@ def safe_float(val, default=0.0):
         return default
 
 
+def _fetch_index_yf(symbol):
+    """Fetch single index via yfinance history(). Returns dict, or None if no data."""
+    hist = yf.Ticker(symbol, session=SESSION).history(period='5d')
+    if hist.empty:
+        return None
+    cv, ch, ch_pct = _daily_change(hist)
+    return {
+        'value': round(safe_float(cv), 2),
+        'change': round(safe_float(ch), 2),
+        'changePercent': round(safe_float(ch_pct), 2)
+    }
+
+
 @app.route('/api/indices', methods=['GET'])
 def get_major_indices():
     """Get major market indices — yahooquery primary, yfinance fallback"""
@@ -349,17 +1397,10 @@ def get_major_indices():
             'DJI': '^DJI'
         }
 
-        results = {}
-        now = datetime.now()
-
         # Cache check
-        uncached = {}
-        for name, symbol in indices.items():
-            hit = _cache_get(symbol)
-            if hit:
-                results[name] = hit[1]
-            else:
-                uncached[name] = symbol
+        hits = _cache_get_many(list(indices.values()))
+        results = {name: hits[symbol][1] for name, symbol in indices.items() if symbol in hits}
+        uncached = {name: symbol for name, symbol in indices.items() if symbol not in hits}
 
         if not uncached:
             return jsonify(results)
@@ -369,17 +1410,11 @@ def get_major_indices():
         if YAHOOQUERY_AVAILABLE:
             try:
                 syms = list(uncached.values())
-
-                def _yq_idx():
-                    return YQTicker(syms).price
-
-                price_map = _retry(_yq_idx)
+                quote_map = _retry(lambda: _yq_quotes(syms))
                 for name, symbol in uncached.items():
-                    d = (price_map or {}).get(symbol)
-                    if isinstance(d, dict) and d.get('regularMarketPrice') is not None:
-                        price = d['regularMarketPrice']
-                        change = d.get('regularMarketChange') or 0
-                        change_pct = (d.get('regularMarketChangePercent') or 0) * 100
+                    fields = _quote_change(quote_map.get(symbol))
+                    if fields is not None:
+                        price, change, change_pct = fields
                         data = {
                             'value': round(safe_float(price), 2),
                             'change': round(safe_float(change), 2),
@@ -395,71 +1430,55 @@ def get_major_indices():
         else:
             yq_failed = dict(uncached)
 
-        # ── Fallback: yfinance batch ───────────────────────────────────────
+        # ── Fallback: yfinance multi-symbol download ───────────────────────
         if yq_failed:
             try:
-                symbols_str = ' '.join(yq_failed.values())
-
-                def _yf_idx():
-                    return yf.Tickers(symbols_str).history(period='5d')
-
-                hist_data = _retry(_yf_idx)
+                hist_map = _retry(lambda: _download_history(list(yq_failed.values()), '5d'))
 
                 yf_failed = {}
                 for name, symbol in yq_failed.items():
                     try:
-                        if symbol in hist_data.columns.get_level_values(1):
-                            sym_data = hist_data.xs(symbol, level=1, axis=1)
-                            if not sym_data.empty and 'Close' in sym_data.columns:
-                                cv = sym_data['Close'].iloc[-1]
-                                if len(sym_data) >= 2:
-                                    pc = sym_data['Close'].iloc[-2]
-                                    ch = cv - pc
-                                    ch_pct = (ch / pc) * 100
-                                else:
-                                    ch = ch_pct = 0
-                                data = {
-                                    'value': round(safe_float(cv), 2),
-                                    'change': round(safe_float(ch), 2),
-                                    'changePercent': round(safe_float(ch_pct), 2)
-                                }
-                                _cache_set(symbol, data)
-                                results[name] = data
-                                continue
+                        sym_data = hist_map.get(symbol)
+                        if sym_data is not None:
+                            cv, ch, ch_pct = _daily_change(sym_data)
+                            data = {
+                                'value': round(safe_float(cv), 2),
+                                'change': round(safe_float(ch), 2),
+                                'changePercent': round(safe_float(ch_pct), 2)
+                            }
+                            _cache_set(symbol, data)
+                            results[name] = data
+                            continue
                         yf_failed[name] = symbol
                     except Exception as e:
                         print(f"Error processing index {name}: {e}")
                         yf_failed[name] = symbol
 
             except Exception as e:
-                print(f"yfinance indices batch failed: {e}")
+                print(f"yfinance indices download failed: {e}")
                 yf_failed = dict(yq_failed)
 
-            # Individual fallback
-            for name, symbol in yf_failed.items():
-                try:
-                    ticker = yf.Ticker(symbol)
-                    hist = ticker.history(period='5d')
-                    if not hist.empty:
-                        cv = hist['Close'].iloc[-1]
-                        if len(hist) >= 2:
-                            pc = hist['Close'].iloc[-2]
-                            ch = cv - pc
-                            ch_pct = (ch / pc) * 100
-                        else:
-                            ch = ch_pct = 0
-                        data = {
-                            'value': round(safe_float(cv), 2),
-                            'change': round(safe_float(ch), 2),
-                            'changePercent': round(safe_float(ch_pct), 2)
-                        }
-                        _cache_set(symbol, data)
-                        results[name] = data
-                    else:
-                        results[name] = {'error': 'No data', 'value': 0, 'change': 0, 'changePercent': 0}
-                    time.sleep(0.3)
-                except Exception as inner_e:
-                    results[name] = {'error': str(inner_e), 'value': 0, 'change': 0, 'changePercent': 0}
+            # Individual fallback, fetched in parallel
+            futures = {
+                name: EXECUTOR.submit(_fetch_index_yf, symbol)
+                for name, symbol in yf_failed.items()
+            }
+            fetched, errors = _gather(futures)
+            for name, data in fetched.items():
+                if data is not None:
+                    _cache_set(yf_failed[name], data)
+                    results[name] = data
+                else:
+                    results[name] = {'error': 'No data', 'value': 0, 'change': 0, 'changePercent': 0}
+            for name, message in errors.items():
+                results[name] = {'error': message, 'value': 0, 'change': 0, 'changePercent': 0}
+
+            # Serve last known good values for indices that still failed
+            failed = [name for name, data in results.items() if 'error' in data]
+            stale = _stale_get_many([indices[name] for name in failed])
+            for name in failed:
+                if indices[name] in stale:
+                    results[name] = stale[indices[name]]
 
         return jsonify(results)
 
@@ -467,32 +1486,61 @@ def get_major_indices():
         return jsonify({'error': str(e)}), 500
 
 
+def _round2(values):
+    """NumPy array → list of Python floats rounded to 2 places."""
+    return [round(v, 2) for v in values.tolist()]
+
+
+def _columnar(columns, **fields):
+    """Columnar response body: key names once, then one list per column."""
+    return {**fields, 'columns': list(columns), 'data': list(columns.values())}
+
+
 @app.route('/api/history/<symbol>', methods=['GET'])
 def get_stock_history(symbol):
     """
     Get historical stock data for charts
     Query params: period (1mo, 3mo, 6mo, 1y, 2y)
+                  stream=1 → one JSON record per line (application/x-ndjson)
+                  format=columnar → {'columns': [...], 'data': [[...], ...]}
     """
     try:
+        if not _valid_symbol(symbol):
+            return jsonify({'error': 'Invalid symbol'}), 400
         period = request.args.get('period', '1y')
+        stream = request.args.get('stream') == '1'
+        columnar = request.args.get('format') == 'columnar'
 
-        ticker = yf.Ticker(symbol)
+        ticker = yf.Ticker(symbol, session=SESSION)
         hist = ticker.history(period=period)
 
         if hist.empty:
             return jsonify({'error': 'No data available'}), 404
 
-        # Format data for chart
-        data = []
-        for index, row in hist.iterrows():
-            data.append({
-                'date': index.strftime('%Y-%m-%d'),
-                'close': round(float(row['Close']), 2),
-                'open': round(float(row['Open']), 2),
-                'high': round(float(row['High']), 2),
-                'low': round(float(row['Low']), 2),
-                'volume': int(row['Volume'])
-            })
+        # Format data for chart: each column converted to Python scalars in
+        # one tolist() call, then zipped into rows (no per-row Series boxing)
+        rounded = hist[['Close', 'Open', 'High', 'Low']].round(2)
+        columns = {
+            'date': hist.index.strftime('%Y-%m-%d').tolist(),
+            'close': rounded['Close'].tolist(),
+            'open': rounded['Open'].tolist(),
+            'high': rounded['High'].tolist(),
+            'low': rounded['Low'].tolist(),
+            'volume': hist['Volume'].astype(int).tolist()
+        }
+        if columnar:
+            return jsonify(_columnar(columns, symbol=symbol, period=period))
+
+        keys = tuple(columns)
+        rows = zip(*columns.values())
+
+        if stream:
+            def generate():
+                for row in rows:
+                    yield orjson.dumps(dict(zip(keys, row))) + b'\n'
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+        data = [dict(zip(keys, row)) for row in rows]
 
         return jsonify({
             'symbol': symbol,
@@ -515,6 +1563,7 @@ def get_portfolio_history():
         ],
         "period": "1y"
     }
+    Query params: format=columnar → {'columns': [...], 'data': [[...], ...]}
     """
     try:
         data = request.get_json(silent=True) or {}
@@ -524,142 +1573,181 @@ def get_portfolio_history():
         if not holdings:
             return jsonify({'error': 'No holdings provided'}), 400
 
-        # Fetch historical data for all stocks
-        all_history = {}
-        for holding in holdings:
-            symbol = holding['symbol']
-            try:
-                ticker = yf.Ticker(symbol)
-                hist = ticker.history(period=period)
-
-                if not hist.empty:
-                    all_history[symbol] = hist
-
-                # Small delay between requests
-                time.sleep(0.2)
-            except Exception as e:
-                print(f"Error fetching {symbol}: {e}")
-                continue
+        # Fetch historical data for all stocks in as few requests as possible
+        symbols = list(dict.fromkeys(h['symbol'] for h in holdings))
+        invalid = [s for s in symbols if not _valid_symbol(s)]
+        if invalid:
+            return jsonify({'error': f'Invalid symbol: {invalid[0]}'}), 400
+        try:
+            all_history = _download_history(symbols, period)
+        except Exception as e:
+            print(f"Error fetching portfolio history: {e}")
+            all_history = {}
+
+        # Symbols the bulk download dropped: retry them one by one, in parallel
+        missing = [s for s in symbols if s not in all_history]
+        futures = {
+            symbol: EXECUTOR.submit(
+                lambda s=symbol: yf.Ticker(s, session=SESSION).history(period=period))
+            for symbol in missing
+        }
+        fetched, errors = _gather(futures)
+        for symbol, hist in fetched.items():
+            hist = hist.dropna(subset=['Close'])
+            if not hist.empty:
+                all_history[symbol] = hist
+        for symbol, message in errors.items():
+            print(f"Error fetching history for {symbol}: {message}")
 
         if not all_history:
             return jsonify({'error': 'No historical data available'}), 404
 
-        # Find common dates across all stocks
-        date_sets = [set(hist.index.strftime('%Y-%m-%d')) for hist in all_history.values()]
-        common_dates = sorted(set.intersection(*date_sets))
-
-        # Calculate portfolio value for each date
-        portfolio_history = []
-        for date_str in common_dates:
-            total_value = 0
-            total_cost = 0
-            tw_value = 0
-            tw_cost = 0
-            us_value = 0
-            us_cost = 0
-
-            for holding in holdings:
-                symbol = holding['symbol']
-                shares = holding['shares']
-                avg_cost = holding['avgCost']
-                market = holding.get('market', 'TW' if '.TW' in symbol else 'US')
-
-                if symbol in all_history:
-                    hist = all_history[symbol]
-                    date_data = hist[hist.index.strftime('%Y-%m-%d') == date_str]
-
-                    if not date_data.empty:
-                        close_price = float(date_data['Close'].iloc[0])
-                        value = close_price * shares
-                        cost = avg_cost * shares
-
-                        total_value += value
-                        total_cost += cost
-
-                        # 分別記錄台股和美股
-                        if market == 'TW':
-                            tw_value += value
-                            tw_cost += cost
-                        else:
-                            us_value += value
-                            us_cost += cost
-
-            if total_value > 0:
-                pnl = total_value - total_cost
-                pnl_percent = (pnl / total_cost) * 100 if total_cost != 0 else 0
-
-                portfolio_history.append({
-                    'date': date_str,
-                    'value': round(total_value, 2),
-                    'cost': round(total_cost, 2),
-                    'twValue': round(tw_value, 2),
-                    'twCost': round(tw_cost, 2),
-                    'usValue': round(us_value, 2),
-                    'usCost': round(us_cost, 2),
-                    'pnl': round(pnl, 2),
-                    'pnlPercent': round(pnl_percent, 2)
-                })
+        # One dates × symbols frame of closes, inner-joined on the trading-day
+        # index so only days common to all stocks remain (yfinance can repeat
+        # the latest bar, so keep one row per day)
+        closes = {}
+        for symbol, hist in all_history.items():
+            days = _trading_days(hist)
+            keep = ~days.duplicated(keep='last')
+            closes[symbol] = pd.Series(hist['Close'].to_numpy()[keep], index=days[keep])
+        closes = pd.concat(closes, axis=1, join='inner').sort_index()
+        common_dates = closes.index
+
+        # Per-holding vectors; holdings without history contribute nothing
+        held = [h for h in holdings if h['symbol'] in all_history]
+        prices = closes[[h['symbol'] for h in held]].to_numpy()  # dates × holdings
+        shares = np.array([h['shares'] for h in held], dtype=float)
+        costs = shares * np.array([h['avgCost'] for h in held], dtype=float)
+        # 分別記錄台股和美股
+        is_tw = np.array([
+            h.get('market', 'TW' if _TW_RE.search(h['symbol']) else 'US') == 'TW'
+            for h in held
+        ], dtype=bool)
+
+        total_values = prices @ shares
+        tw_values = prices[:, is_tw] @ shares[is_tw]
+        us_values = prices[:, ~is_tw] @ shares[~is_tw]
+        total_cost = float(costs.sum())
+        tw_cost = float(costs[is_tw].sum())
+        us_cost = float(costs[~is_tw].sum())
+
+        # Output columns over the days with a positive portfolio value
+        keep = total_values > 0
+        n = int(keep.sum())
+        pnl = total_values[keep] - total_cost
+        pnl_percent = (pnl / total_cost) * 100 if total_cost != 0 else np.zeros(n)
+        columns = {
+            'date': common_dates[keep].strftime('%Y-%m-%d').tolist(),
+            'value': _round2(total_values[keep]),
+            'cost': [round(total_cost, 2)] * n,
+            'twValue': _round2(tw_values[keep]),
+            'twCost': [round(tw_cost, 2)] * n,
+            'usValue': _round2(us_values[keep]),
+            'usCost': [round(us_cost, 2)] * n,
+            'pnl': _round2(pnl),
+            'pnlPercent': _round2(pnl_percent)
+        }
 
+        if request.args.get('format') == 'columnar':
+            return jsonify(_columnar(columns, period=period))
+
+        keys = tuple(columns)
         return jsonify({
             'period': period,
-            'data': portfolio_history
+            'data': [dict(zip(keys, row)) for row in zip(*columns.values())]
         })
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def _fetch_exchange_rate():
+    """Fetch USD/TWD from upstream and cache it. Returns (timestamp, rate)."""
+    rate = None
+
+    # Method 1: Try TWD=X
+    try:
+        ticker = yf.Ticker('TWD=X', session=SESSION)
+        hist = ticker.history(period='5d')
+
+        if not hist.empty:
+            rate = float(hist['Close'].iloc[-1])
+    except Exception:
+        pass
+
+    # Method 2: If failed, try open.er-api.com (independent of Yahoo)
+    if rate is None or rate == 0:
+        try:
+            resp = FX_SESSION.get('https://open.er-api.com/v6/latest/USD', timeout=10)
+            rate = float(resp.json()['rates']['TWD'])
+        except Exception:
+            pass
+
+    # Fallback rate if all methods fail
+    if rate is None or rate == 0:
+        rate = 31.5
+
+    now = datetime.now()
+    exchange_rate_cache['USDTWD'] = (now, rate)
+    _shared_set('v1:fx:USDTWD', EXCHANGE_RATE_CACHE_DURATION, now, rate)
+    return now, rate
+
+
+def _exchange_rate_coalesced():
+    """
+    Run _fetch_exchange_rate() at most once at a time per process:
+    concurrent callers wait on the in-flight Future instead of each
+    going upstream. The owner fetches on its own thread, so a busy
+    EXECUTOR cannot delay it.
+    """
+    global _fx_inflight
+    with _fx_lock:
+        future = _fx_inflight
+        owner = future is None
+        if owner:
+            future = _fx_inflight = Future()
+    if not owner:
+        return future.result(timeout=FX_FETCH_TIMEOUT)
+    try:
+        result = _fetch_exchange_rate()
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _fx_lock:
+            _fx_inflight = None
+
+
 @app.route('/api/exchange-rate', methods=['GET'])
 def get_exchange_rate():
     """
     Get USD to TWD exchange rate
     """
     try:
-        # Check cache first
-        now = datetime.now()
-        if 'USDTWD' in exchange_rate_cache:
-            cached_time, cached_rate = exchange_rate_cache['USDTWD']
+        # Check cache first (in-process, then the shared cache)
+        now = g.now
+        hit = exchange_rate_cache.get('USDTWD')
+        if not hit or (now - hit[0]).total_seconds() >= EXCHANGE_RATE_CACHE_DURATION:
+            hit = _shared_get('v1:fx:USDTWD')
+        if hit:
+            cached_time, cached_rate = hit
             if (now - cached_time).total_seconds() < EXCHANGE_RATE_CACHE_DURATION:
+                exchange_rate_cache['USDTWD'] = hit
                 return jsonify({
                     'rate': cached_rate,
                     'cached': True,
                     'timestamp': cached_time.isoformat()
                 })
 
-        # Try multiple sources for exchange rate
-        rate = None
-
-        # Method 1: Try TWD=X
-        try:
-            ticker = yf.Ticker('TWD=X')
-            hist = ticker.history(period='5d')
-
-            if not hist.empty:
-                rate = float(hist['Close'].iloc[-1])
-        except Exception:
-            pass
-
-        # Method 2: If failed, try USDTWD=X
-        if rate is None or rate == 0:
-            try:
-                ticker = yf.Ticker('USDTWD=X')
-                hist = ticker.history(period='5d')
-
-                if not hist.empty:
-                    rate = float(hist['Close'].iloc[-1])
-            except Exception:
-                pass
-
-        # Fallback rate if all methods fail
-        if rate is None or rate == 0:
-            rate = 31.5
-
-        exchange_rate_cache['USDTWD'] = (now, rate)
+        # Cache miss: fetch, sharing any fetch already in flight
+        fetched_time, rate = _exchange_rate_coalesced()
 
         return jsonify({
             'rate': round(rate, 4),
             'cached': False,
-            'timestamp': now.isoformat()
+            'timestamp': fetched_time.isoformat()
         })
 
     except Exception as e:
@@ -689,37 +1777,38 @@ def get_portfolio_allocation():
         if not holdings:
             return jsonify({'error': 'No holdings provided'}), 400
 
-        total_value = sum(h['value'] for h in holdings)
-
-        # Calculate allocation by stock
-        by_stock = []
-        for holding in holdings:
-            percentage = (holding['value'] / total_value) * 100 if total_value > 0 else 0
-            by_stock.append({
-                'symbol': holding['symbol'],
-                'value': holding['value'],
-                'percentage': round(percentage, 2)
-            })
+        # Holdings as parallel arrays; totals and shares are vector operations
+        symbols = [h['symbol'] for h in holdings]
+        markets = [h.get('market', 'US') for h in holdings]
+        values = np.array([h['value'] for h in holdings])
+        total_value = values.sum()
+        scale = 100 / total_value if total_value > 0 else 0
+
+        # Allocation by stock (stable: equal values keep input order)
+        stock_values = values.tolist()
+        stock_pct = np.round(values * scale, 2).tolist()
+        by_stock = [
+            {'symbol': symbols[i], 'value': stock_values[i], 'percentage': stock_pct[i]}
+            for i in np.argsort(-values, kind='stable').tolist()
+        ]
 
-        # Calculate allocation by market
-        market_totals = {}
-        for holding in holdings:
-            market = holding.get('market', 'US')
-            market_totals[market] = market_totals.get(market, 0) + holding['value']
-
-        by_market = []
-        for market, value in market_totals.items():
-            percentage = (value / total_value) * 100 if total_value > 0 else 0
-            by_market.append({
-                'market': market,
-                'value': value,
-                'percentage': round(percentage, 2)
-            })
+        # Allocation by market: codes in first-seen order (any market value,
+        # null included, is its own group), one bincount, stable sort for ties
+        codes = {}
+        inverse = np.array([codes.setdefault(m, len(codes)) for m in markets])
+        names = list(codes)
+        # bincount sums in float; cast back so integer values stay integers
+        market_values = np.bincount(inverse, weights=values).astype(values.dtype, copy=False)
+        market_pct = np.round(market_values * scale, 2)
+        by_market = [
+            {'market': names[i], 'value': market_values[i].item(), 'percentage': market_pct[i].item()}
+            for i in np.argsort(-market_values, kind='stable').tolist()
+        ]
 
         return jsonify({
             'totalValue': total_value,
-            'byStock': sorted(by_stock, key=lambda x: x['value'], reverse=True),
-            'byMarket': sorted(by_market, key=lambda x: x['value'], reverse=True)
+            'byStock': by_stock,
+            'byMarket': by_market
         })
 
     except Exception as e:
@@ -735,35 +1824,23 @@ def get_stock_news(symbol):
     Query params: limit (default 5)
     """
     try:
+        if not _valid_symbol(symbol):
+            return jsonify({'error': 'Invalid symbol'}), 400
         limit = int(request.args.get('limit', 5))
-        now = datetime.now()
-
-        # Check cache first
-        cache_key = f"news_{symbol}"
-        if cache_key in news_cache:
-            cached_time, cached_data = news_cache[cache_key]
-            if (now - cached_time).total_seconds() < NEWS_CACHE_DURATION:
-                return jsonify({
-                    'symbol': symbol,
-                    'news': cached_data[:limit],
-                    'cached': True,
-                    'timestamp': cached_time.isoformat()
-                })
-
-        news_items = []
+        now = g.now
 
-        # Check if Taiwan stock
-        is_tw_stock = '.TW' in symbol.upper() or '.TWO' in symbol.upper()
-
-        if is_tw_stock:
-            # Use Google News RSS for Taiwan stocks
-            news_items = fetch_google_news(symbol, limit)
-        else:
-            # Use yfinance for US stocks
-            news_items = fetch_yfinance_news(symbol, limit)
+        # Check cache first (recently expired entries are refreshed in the background)
+        hit = _news_cache_get(symbol) or _news_get_revalidating([symbol], limit).get(symbol)
+        if hit:
+            cached_time, cached_data = hit
+            return jsonify({
+                'symbol': symbol,
+                'news': cached_data[:limit],
+                'cached': True,
+                'timestamp': cached_time.isoformat()
+            })
 
-        # Cache the results
-        news_cache[cache_key] = (now, news_items)
+        news_items = _fetch_news_coalesced(symbol, limit)
 
         return jsonify({
             'symbol': symbol,
@@ -780,16 +1857,88 @@ def get_stock_news(symbol):
         }), 200
 
 
+def _fetch_news(symbol, limit):
+    """Google News RSS for Taiwan stocks, yfinance news for everything else."""
+    if _TW_RE.search(symbol):
+        return fetch_google_news(symbol, limit)
+    return fetch_yfinance_news(symbol, limit)
+
+
+def _fetch_and_cache_news(symbol, limit):
+    """Owner half of _fetch_news_coalesced()."""
+    news_items = _fetch_news(symbol, limit)
+    _news_cache_set(symbol, news_items)
+    return news_items
+
+
+def _fetch_news_coalesced(symbol, limit):
+    """
+    Fetch and cache news for symbol at most once at a time per process:
+    concurrent misses for the same symbol wait on the in-flight Future
+    instead of each going upstream. The owner fetches on its own thread,
+    as in _exchange_rate_coalesced().
+    """
+    with _news_inflight_lock:
+        future = _news_inflight.get(symbol)
+        owner = future is None
+        if owner:
+            future = _news_inflight[symbol] = Future()
+    if not owner:
+        return future.result(timeout=NEWS_FETCH_TIMEOUT)
+    try:
+        news_items = _fetch_and_cache_news(symbol, limit)
+        future.set_result(news_items)
+        return news_items
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _news_inflight_lock:
+            _news_inflight.pop(symbol, None)
+
+
+def _news_get_revalidating(symbols, limit):
+    """
+    Stale-while-revalidate for news: entries at most NEWS_SWR_WINDOW seconds
+    past NEWS_CACHE_DURATION are returned as they are, and each is refreshed
+    by one background fetch. Returns {symbol: (timestamp, news_items)}.
+    """
+    now = datetime.now()
+    found = {}
+    for symbol in symbols:
+        entry = _news_cache_peek(symbol)
+        if entry and (now - entry[0]).total_seconds() < NEWS_CACHE_DURATION + NEWS_SWR_WINDOW:
+            found[symbol] = entry
+    with _news_refresh_lock:
+        todo = [symbol for symbol in found if symbol not in _news_refreshing]
+        _news_refreshing.update(todo)
+    for symbol in todo:
+        REVALIDATE_EXECUTOR.submit(_revalidate_news, symbol, limit)
+    return found
+
+
+def _revalidate_news(symbol, limit):
+    """Background half of _news_get_revalidating()."""
+    try:
+        news_items = _fetch_news(symbol, limit)
+        if news_items:  # a failed fetch leaves the old entry to age out
+            _news_cache_set(symbol, news_items)
+    finally:
+        with _news_refresh_lock:
+            _news_refreshing.discard(symbol)
+
+
 def fetch_yfinance_news(symbol, limit=5):
     """Fetch news using yfinance"""
     try:
-        ticker = yf.Ticker(symbol)
+        ticker = yf.Ticker(symbol, session=SESSION)
         raw_news = ticker.news
 
         if not raw_news:
             return []
 
         news_items = []
+        now = datetime.now()
         for item in raw_news[:limit]:
             # Handle new yfinance news format (nested under 'content')
             content = item.get('content', item)  # Fallback to item if no 'content' key
@@ -824,7 +1973,7 @@ def fetch_yfinance_news(symbol, limit=5):
                     pub_date = datetime.fromisoformat(pub_date_str.replace('Z', '+00:00'))
                     # Convert to local time (remove timezone info for comparison)
                     pub_date = pub_date.replace(tzinfo=None)
-                    time_ago = get_time_ago(pub_date)
+                    time_ago = get_time_ago(pub_date, now)
                     pub_time = pub_date
                 except Exception:
                     pass
@@ -833,7 +1982,7 @@ def fetch_yfinance_news(symbol, limit=5):
             if not pub_time and item.get('providerPublishTime'):
                 try:
                     pub_date = datetime.fromtimestamp(item.get('providerPublishTime'))
-                    time_ago = get_time_ago(pub_date)
+                    time_ago = get_time_ago(pub_date, now)
                     pub_time = pub_date
                 except Exception:
                     pass
@@ -864,31 +2013,24 @@ def fetch_google_news(symbol, limit=5):
     """Fetch news from Google News RSS for Taiwan stocks"""
     try:
         # Extract stock number from symbol (e.g., 2330.TW -> 2330)
-        stock_number = symbol.replace('.TW', '').replace('.TWO', '')
+        stock_number = _TW_RE.sub('', symbol)
 
         # Search query - try to get company name or use stock number
         search_query = f"{stock_number} 股票"
 
-        # Google News RSS URL
-        encoded_query = urllib.parse.quote(search_query)
-        url = f"https://news.google.com/rss/search?q={encoded_query}&hl=zh-TW&gl=TW&ceid=TW:zh-Hant"
-
-        # Create request with headers
-        req = urllib.request.Request(url, headers={
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
-
-        # Fetch RSS feed
-        with urllib.request.urlopen(req, timeout=10) as response:
-            xml_data = response.read().decode('utf-8')
-
-        # Parse XML
-        root = ET.fromstring(xml_data)
+        # Fetch Google News RSS feed over the pooled keep-alive session
+        response = NEWS_SESSION.get(
+            'https://news.google.com/rss/search',
+            params={'q': search_query, 'hl': 'zh-TW', 'gl': 'TW', 'ceid': 'TW:zh-Hant'},
+            timeout=10
+        )
+        response.raise_for_status()
 
         news_items = []
-        items = root.findall('.//item')
+        now = datetime.now()
 
-        for item in items[:limit]:
+        # Parse incrementally and stop after `limit` items
+        for item in islice(_iter_rss_items(response.content), limit):
             title = item.find('title')
             link = item.find('link')
             pub_date = item.find('pubDate')
@@ -899,22 +2041,13 @@ def fetch_google_news(symbol, limit=5):
             pub_datetime = None
             if pub_date is not None and pub_date.text:
                 try:
-                    # Parse RFC 2822 date format
-                    pub_datetime = datetime.strptime(
-                        pub_date.text,
-                        '%a, %d %b %Y %H:%M:%S %Z'
-                    )
-                    time_ago = get_time_ago(pub_datetime)
-                except Exception:
-                    try:
-                        # Try alternative format
-                        pub_datetime = datetime.strptime(
-                            pub_date.text[:25],
-                            '%a, %d %b %Y %H:%M:%S'
-                        )
-                        time_ago = get_time_ago(pub_datetime)
-                    except Exception:
-                        pass
+                    # RFC 2822 date; normalise to naive UTC like the yfinance news times
+                    pub_datetime = parsedate_to_datetime(pub_date.text)
+                    if pub_datetime.tzinfo is not None:
+                        pub_datetime = pub_datetime.astimezone(timezone.utc).replace(tzinfo=None)
+                    time_ago = get_time_ago(pub_datetime, now)
+                except (TypeError, ValueError):
+                    pub_datetime = None
 
             news_items.append({
                 'title': title.text if title is not None else '',
@@ -932,26 +2065,38 @@ def fetch_google_news(symbol, limit=5):
         return []
 
 
-def get_time_ago(dt):
-    """Convert datetime to relative time string"""
-    now = datetime.now()
-    diff = now - dt
-
-    seconds = diff.total_seconds()
-
-    if seconds < 60:
-        return '剛剛'
-    elif seconds < 3600:
-        minutes = int(seconds / 60)
-        return f'{minutes} 分鐘前'
-    elif seconds < 86400:
-        hours = int(seconds / 3600)
-        return f'{hours} 小時前'
-    elif seconds < 604800:
-        days = int(seconds / 86400)
-        return f'{days} 天前'
+# get_time_ago buckets: upper bound in seconds → (label, unit in seconds)
+_TIME_AGO_BOUNDS = (60, 3600, 86400, 604800)
+_TIME_AGO_LABELS = (('剛剛', None), ('{} 分鐘前', 60), ('{} 小時前', 3600), ('{} 天前', 86400))
+
+
+def _iter_rss_items(content):
+    """
+    Yield RSS <item> elements from raw feed bytes (so the feed's own
+    encoding declaration is honoured) as soon as each one is parsed,
+    clearing it afterwards. The rest of the document is never parsed
+    once the caller stops iterating.
+    """
+    if LXML_AVAILABLE:
+        events = ET.iterparse(BytesIO(content), events=('end',), tag='item',
+                              resolve_entities=False, no_network=True)
     else:
+        events = (ev for ev in ET.iterparse(BytesIO(content), events=('end',))
+                  if ev[1].tag == 'item')
+    for _, item in events:
+        yield item
+        item.clear()
+
+
+def get_time_ago(dt, now=None):
+    """Convert datetime to relative time string; pass now when formatting many items"""
+    seconds = ((now or datetime.now()) - dt).total_seconds()
+
+    i = bisect_right(_TIME_AGO_BOUNDS, seconds)
+    if i == len(_TIME_AGO_LABELS):
         return dt.strftime('%m/%d')
+    label, unit = _TIME_AGO_LABELS[i]
+    return label.format(int(seconds / unit)) if unit else label
 
 
 @app.route('/api/news/batch', methods=['POST'])
@@ -961,40 +2106,39 @@ def get_batch_news():
     Body: {"symbols": ["AAPL", "2330.TW"], "limit": 3}
     """
     try:
-        symbols = request.json.get('symbols', [])
+        requested = request.json.get('symbols', [])
+        symbols = [s for s in requested if _valid_symbol(s)]
+        rejected = {str(s): {'error': 'Invalid symbol'} for s in requested if not _valid_symbol(s)}
         limit = request.json.get('limit', 3)
 
         if not symbols:
-            return jsonify({})
-
-        results = {}
-        now = datetime.now()
+            return jsonify(rejected)
 
-        for symbol in symbols:
-            cache_key = f"news_{symbol}"
+        hits = _news_cache_get_many(symbols)
+        hits.update(_news_get_revalidating([s for s in symbols if s not in hits], limit))
 
-            # Check cache
-            if cache_key in news_cache:
-                cached_time, cached_data = news_cache[cache_key]
-                if (now - cached_time).total_seconds() < NEWS_CACHE_DURATION:
-                    results[symbol] = cached_data[:limit]
-                    continue
+        # Fetch all cache misses in parallel; wall time is the slowest
+        # symbol rather than the sum, and the pooled sessions cap upstream
+        # connections on their own
+        futures = {
+            symbol: EXECUTOR.submit(_fetch_news, symbol, limit)
+            for symbol in dict.fromkeys(symbols) if symbol not in hits
+        }
+        fetched, errors = _gather(futures)
+        for symbol, message in errors.items():
+            print(f"Error fetching news for {symbol}: {message}")
 
-            # Fetch news
-            is_tw_stock = '.TW' in symbol.upper() or '.TWO' in symbol.upper()
+        # Cache everything fetched in one go
+        _news_cache_set_many(fetched)
 
-            if is_tw_stock:
-                news_items = fetch_google_news(symbol, limit)
+        results = dict(rejected)
+        for symbol in symbols:
+            if symbol in hits:
+                results[symbol] = hits[symbol][1][:limit]
+            elif symbol in fetched:
+                results[symbol] = fetched[symbol][:limit]
             else:
-                news_items = fetch_yfinance_news(symbol, limit)
-
-            # Cache and add to results
-            news_cache[cache_key] = (now, news_items)
-            results[symbol] = news_items[:limit]
-
-            # Small delay between requests
-            time.sleep(0.3)
-
+                results[symbol] = []
         return jsonify(results)
 
     except Exception as e:
@@ -1006,41 +2150,85 @@ def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'ok',
-        'timestamp': datetime.now().isoformat(),
+        'timestamp': g.now.isoformat(),
         'cache_size': len(price_cache),
         'cache_max': MAX_CACHE_SIZE,
         'cache_ttl_seconds': CACHE_DURATION,
         'yahooquery': YAHOOQUERY_AVAILABLE,
-        'news_cache_size': len(news_cache)
+        'news_cache_size': len(news_cache),
+        'news_cache_max': MAX_NEWS_CACHE_SIZE
     })
 
 
 @app.route('/', methods=['GET'])
 def serve_index():
-    """Serve the main HTML page"""
-    html_path = os.path.join(os.path.dirname(__file__), 'stock-portfolio-optimized.html')
-    return send_file(html_path)
+    """Serve the main HTML page (from memory, gzip-compressed when accepted)"""
+    try:
+        etag, body, body_gz = _load_index_page()
+    except FileNotFoundError:
+        abort(404)
+    if request.accept_encodings['gzip'] > 0:  # q=0 means 'not acceptable'
+        response = app.response_class(body_gz, mimetype='text/html')
+        response.headers['Content-Encoding'] = 'gzip'  # flask-compress leaves it alone
+        etag += '-gzip'
+    else:
+        response = app.response_class(body, mimetype='text/html')
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={INDEX_MAX_AGE}'
+    return response.make_conditional(request)
+
+
+def _load_index_page():
+    """Read and gzip the index page once; every later request reuses it."""
+    global _index_page
+    if _index_page is None:
+        with open(INDEX_HTML_PATH, 'rb') as f:
+            body = f.read()
+        _index_page = (hashlib.blake2b(body, digest_size=8).hexdigest(), body,
+                       gzip.compress(body, compresslevel=9, mtime=0))
+    return _index_page
+
+
+# Keep popular symbols warm in the background
+threading.Thread(target=_refresh_loop, name='price-refresher', daemon=True).start()
 
 
 if __name__ == '__main__':
-    print("Starting Stock Portfolio API Server (Fixed Version)...")
-    print("Server will run on http://0.0.0.0:5000")
-    print("Accessible from network devices")
-    print("\nFeatures:")
-    print(f"  - Dual-path fetch: {'yahooquery + yfinance' if YAHOOQUERY_AVAILABLE else 'yfinance only'}")
-    print("  - Exponential backoff retry (up to 3 attempts)")
-    print("  - LRU price cache (max 500 entries, TTL 300s)")
-    print("  - 500ms rate limit between requests to same symbol")
-    print("\nAvailable endpoints:")
-    print("  GET  /api/stock/<symbol>        - Get single stock price")
-    print("  POST /api/stocks/batch          - Get multiple stock prices")
-    print("  GET  /api/indices               - Get major market indices")
-    print("  GET  /api/history/<symbol>      - Get stock historical data")
-    print("  POST /api/portfolio/history     - Get portfolio value history")
-    print("  GET  /api/exchange-rate         - Get USD/TWD exchange rate")
-    print("  POST /api/portfolio/allocation  - Get portfolio allocation breakdown")
-    print("  GET  /api/news/<symbol>         - Get stock news (US: yfinance, TW: Google News)")
-    print("  POST /api/news/batch            - Get news for multiple stocks")
-    print("  GET  /health                    - Health check")
-    print("\n" + "="*60)
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # The Werkzeug reloader (FLASK_DEBUG=1) re-runs this module in a child
+    # process with WERKZEUG_RUN_MAIN=true; print the banner only once
+    if os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        print("\n".join([
+            "Starting Stock Portfolio API Server (Fixed Version)...",
+            "Server will run on http://0.0.0.0:5000",
+            "Accessible from network devices",
+            "",
+            "Features:",
+            f"  - Dual-path fetch: {'yahooquery + yfinance' if YAHOOQUERY_AVAILABLE else 'yfinance only'}",
+            "  - Exponential backoff retry (up to 3 attempts)",
+            f"  - LRU price cache (max {MAX_CACHE_SIZE} entries, TTL {CACHE_DURATION}s)",
+            f"  - Rate limit: {RATE_LIMIT_MAX} upstream fetches per symbol per {RATE_LIMIT_WINDOW:g}s",
+            f"  - Yahoo token bucket: burst {UPSTREAM_BURST}, {UPSTREAM_RATE:g} requests/s, "
+            f"at most {UPSTREAM_MAX_INFLIGHT} in flight",
+            "",
+            "Available endpoints:",
+            "  GET  /api/stock/<symbol>        - Get single stock price",
+            "  POST /api/stocks/batch          - Get multiple stock prices",
+            "  GET  /api/indices               - Get major market indices",
+            "  GET  /api/history/<symbol>      - Get stock historical data",
+            "  POST /api/portfolio/history     - Get portfolio value history",
+            "  GET  /api/exchange-rate         - Get USD/TWD exchange rate",
+            "  POST /api/portfolio/allocation  - Get portfolio allocation breakdown",
+            "  GET  /api/news/<symbol>         - Get stock news (US: yfinance, TW: Google News)",
+            "  POST /api/news/batch            - Get news for multiple stocks",
+            "  GET  /health                    - Health check",
+            "",
+            "=" * 60,
+        ]), flush=True)
+    # Production runs under gunicorn with gevent workers (see Procfile)
+    if GEVENT_AVAILABLE:
+        from gevent.pywsgi import WSGIServer
+        print("Serving with gevent WSGIServer")
+        WSGIServer(('0.0.0.0', 5000), app).serve_forever()
+    else:
+        app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=5000, threaded=True)
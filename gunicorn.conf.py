@@ -0,0 +1,19 @@
+"""
+gunicorn settings for api_server_fixed (Procfile / render.yaml).
+
+Every endpoint waits on Yahoo / Google News, so workers are sized for
+concurrent I/O rather than CPU:
+  gevent  (default) — one worker interleaves up to worker_connections requests
+  gthread           — GUNICORN_WORKER_CLASS=gthread, GUNICORN_THREADS per worker
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = 1000                              # gevent
+threads = int(os.environ.get('GUNICORN_THREADS', 16))  # gthread
+
+# A cold batch (retries + fallbacks) can take longer than the default 30s
+timeout = 60